@@ -1 +1,2 @@
 from .facet import Facet
+from .util import Quantiles
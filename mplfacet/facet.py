@@ -1,28 +1,143 @@
-from collections import namedtuple
-from functools import wraps, partial
+from functools import wraps
 
 import numpy as np
 from matplotlib.axes import Axes
 
-from .util import subplots, groupby
+from .util import (subplots, groupby, unique, binned_kde, bin_codes,
+                   Quantiles)
+
+
+class _FacetData(object):
+    """
+    Read-only sequence of the data columns in a single facet.
+
+    Each column is extracted from the full data array the first
+    time it is accessed, and cached afterwards
+    """
+    __slots__ = ('_source', '_index', '_cache')
+
+    def __init__(self, source, index):
+        self._source = source
+        self._index = index
+        self._cache = [None] * len(source)
+
+    def __len__(self):
+        return len(self._source)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return tuple(self[j] for j in range(*i.indices(len(self))))
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("FacetData index out of range")
+        result = self._cache[i]
+        if result is None:
+            result = self._cache[i] = np.asarray(self._source[i])[self._index]
+        return result
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+class FacetItem(object):
+    """
+    A single facet, yielded when iterating over a Facet
+
+    Attributes
+    ----------
+    axes : The axes object for this facet
+    data : A sequence of the faceted data, extracted on first access
+    key : The value(s) of the key used for the facet
+    label : A label for key
+
+    Calling an axes plot method (e.g. `scatter`) on a FacetItem
+    will automatically pass the faceted data to the appropriate axes
+    """
+    __slots__ = ('axes', 'key', 'label', '_source', '_index', '_data')
+
+    #(axes class, method name) -> wrapper function, shared by all items
+    _methods = {}
+
+    def __init__(self, axes, source, index, key, label):
+        self.axes = axes
+        self.key = key
+        self.label = label
+        self._source = source
+        self._index = index
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = _FacetData(self._source, self._index)
+        return self._data
+
+    #support indexing and unpacking, like the (axes, data, key, label)
+    #namedtuple used by earlier versions
+    def _astuple(self):
+        return (self.axes, self.data, self.key, self.label)
+
+    def __iter__(self):
+        return iter(self._astuple())
+
+    def __len__(self):
+        return 4
 
+    def __getitem__(self, i):
+        return self._astuple()[i]
 
-FacetItem = namedtuple('FacetItem', 'axes data key label')
+    def _asdict(self):
+        return dict(zip(('axes', 'data', 'key', 'label'), self._astuple()))
 
+    def __repr__(self):
+        return "FacetItem(axes=%r, key=%r, label=%r)" % (self.axes, self.key,
+                                                         self.label)
 
-def _axeswrap(self, key):
-    target = getattr(self.axes, key)
+    @classmethod
+    def _wrapper(cls, axes_cls, name):
+        """
+        Return a (cached) function which calls the axes method `name`,
+        passing the faceted data as the first arguments
+        """
+        try:
+            return cls._methods[axes_cls, name]
+        except KeyError:
+            pass
+
+        target = getattr(axes_cls, name, None)
+        if name.startswith('_') or not hasattr(target, '__call__'):
+            raise AttributeError("%s is not a valid Axes plot method" % name)
+
+        def method(self, *args, **kwargs):
+            args = tuple(self.data) + args
+            return getattr(self.axes, name)(*args, **kwargs)
+
+        result = wraps(target)(method)
+        hdr = "Faceted Wrapper for %s\n\n" % name
+        result.__doc__ = hdr + (target.__doc__ or '')
+        cls._methods[axes_cls, name] = result
+        return result
 
-    result = wraps(target)(partial(target, *self.data))
-    hdr = "Faceted Wrapper for %s\n\n" % target.__name__
-    result.__doc__ = hdr + result.__doc__
-    return result
-FacetItem.__getattr__ = _axeswrap
+    def __getattr__(self, name):
+        if name.startswith('_') or name in ('axes', 'data', 'key', 'label'):
+            raise AttributeError(name)
+        method = self._wrapper(type(self.axes), name)
+        return method.__get__(self, type(self))
 
 
 class Facet(object):
+
+    #axes method name -> dispatching wrapper, shared by all facets
+    _methods = {}
+
     def __init__(self, keys, data, labeler=None,
-                 xlabel=None, ylabel=None, **subplot_opts):
+                 xlabel=None, ylabel=None, bins=None, processes=None,
+                 **subplot_opts):
         """
         Create a new facet object
 
@@ -44,7 +159,8 @@ class Facet(object):
           function, will use result from labeler(key) for label
           Otherwise, will use the result from labeler[key] for
           label. Key will an object if faceting on one
-          item. Otherwise, it will be a 2-tuple
+          item. Otherwise, it will be a 2-tuple. For binned
+          keys, the key is the interval label of the bin
 
         xlabel : str (optional)
           X axis label
@@ -52,6 +168,22 @@ class Facet(object):
         ylabel : str (optional)
           Y axis label
 
+        bins : binning spec, or list of two specs (optional)
+          Partition continuous keys into bins, rather than
+          by equal values. Each spec can be an int (number of
+          equal-width bins), a `Quantiles` instance (number of
+          equal-count bins), or a sequence of bin edges. When
+          faceting on two keys, provide a list with one spec
+          per key (or None, to leave a key unbinned). Bin
+          intervals are used as the facet keys.
+          See `~mplfacet.util.bin_codes`
+
+        processes : int (optional)
+          If greater than 1, sort and group the keys using this
+          many processes. Useful for very large arrays. Each key
+          is sorted once; the remaining passes over the keys
+          are linear, or binary searches over the unique values
+
         Extra keywords will be passed to `~matplotlib.pyplot.subplots`.
 
         Examples
@@ -70,6 +202,9 @@ class Facet(object):
 
         #make a faceted grid, based on two variables
         f = Facet(k1, k2, [x, y]).scatter()
+
+        #facet on quartiles of a continuous variable
+        f = Facet(price, [x, y], bins=Quantiles(4)).scatter()
         """
         if isinstance(data, np.ndarray):
             self.data = (data,)
@@ -81,30 +216,71 @@ class Facet(object):
             self._keys = [keys]
         elif len(keys) == 2 and np.shape(keys[0]) == np.shape(keys[1]) == shp:
             #2 keys provided
-            self._keys = keys
+            self._keys = list(keys)
         else:
             raise ValueError("Keys must be an array shaped like the data, "
                              "or a list of two such arrays")
 
-        nfacet = np.product([np.unique(k).size for k in self._keys])
+        #replace binned keys with bin codes, and remember
+        #the interval label of each code
+        self._bin_labels = [None] * len(self._keys)
+        for i, spec in enumerate(self._bin_specs(bins)):
+            if spec is not None:
+                self._keys[i], self._bin_labels[i] = bin_codes(self._keys[i],
+                                                               spec)
+
+        #the unique values in the start of each key give a cheap
+        #lower bound on the number of facets, which catches most
+        #continuous keys before sorting them in full
+        nfacet = np.product([np.unique(np.ravel(k)[:1000]).size
+                             for k in self._keys])
+        if nfacet > 50:
+            raise ValueError("Too many facets to plot (limit=50): "
+                             "at least %i" % nfacet)
+
+        #sort each key once, and reuse the unique values. The
+        #non-empty bins of binned keys are found without sorting
+        self._uniques = []
+        for k, labels in zip(self._keys, self._bin_labels):
+            if labels is None:
+                u = unique(k, processes=processes)
+            else:
+                u = np.flatnonzero(np.bincount(np.ravel(k),
+                                               minlength=len(labels)))
+            self._uniques.append(u)
+        nfacet = np.product([u.size for u in self._uniques])
         if nfacet > 50:
             raise ValueError("Too many facets to plot (limit=50): %i" % nfacet)
 
         if nfacet == 0:
             raise ValueError("No data to facet!")
 
-        self._key_index = [dict((k, i) for i, k in enumerate(np.unique(key)))
-                           for key in self._keys]
+        self._key_index = [dict((k, i) for i, k in enumerate(u))
+                           for u in self._uniques]
 
         self._labeler = labeler
         self._xlabel = xlabel
         self._ylabel = ylabel
+        self._processes = processes
 
         self.subplot_opts = subplot_opts.copy()
         nr, nc = self._subplot_dims()
         self.subplot_opts['nrows'] = nr
         self.subplot_opts['ncols'] = nc
 
+    def _bin_specs(self, bins):
+        """Normalize the bins argument to one spec per key"""
+        if bins is None:
+            return [None] * len(self._keys)
+        if len(self._keys) == 1:
+            return [bins]
+        if isinstance(bins, Quantiles) or np.ndim(bins) == 0:
+            return [bins, bins]
+        if len(bins) != 2:
+            raise ValueError("Two keys specified: bins must be a "
+                             "single spec, or a list of two specs")
+        return list(bins)
+
     def _subplot_dims(self):
         """Determine size of subplot grid, given possible
         constraints on nrows, ncols"""
@@ -204,13 +380,15 @@ class Facet(object):
             Name of an axes method to cal
         """
         for item in self:
-            a = item.data
-            a.extend(args)
+            a = tuple(item.data) + args
             method = getattr(item.axes, func)
             method(*a, **kwargs)
             item.axes.set_title(item.label)
 
-        f = item.axes.figure
+        self._label_figure(item.axes.figure)
+
+    def _label_figure(self, f):
+        """Add the x and y labels to a figure"""
         textopts = dict(size='large')
         if self._xlabel is not None:
             f.text(.5, 0, self._xlabel, ha='center', **textopts)
@@ -218,6 +396,60 @@ class Facet(object):
             f.text(0, .5, self._ylabel, va='center', rotation='vertical',
                    **textopts)
 
+    def kde(self, bandwidth=None, gridsize=512, extent=None, **kwargs):
+        """
+        Plot a Gaussian kernel density estimate of the data in each facet
+
+        The densities of all facets are computed at once, by binning
+        the data onto a shared grid and convolving with each kernel
+
+        Parameters
+        ----------
+        bandwidth : float or array-like (optional)
+          The standard deviation of the Gaussian kernel. Either a single
+          value for all facets, or one value per facet (one per
+          row/column combination when faceting on two keys, in
+          row-major order). By default, the normal reference
+          rule (1.06 * std * n ** -0.2) is applied to each facet
+
+        gridsize : int (optional)
+          Number of points at which to evaluate each density
+
+        extent : (lo, hi) (optional)
+          Range of the evaluation grid. Defaults to the range
+          of the data, padded by 3 bandwidths
+
+        Extra keywords are passed to `~matplotlib.axes.Axes.plot`.
+        Only the first data array is used.
+
+        Returns
+        -------
+        grid, density
+
+        grid : The x values where densities are evaluated
+        density : Array of densities, with one row per facet
+
+        Examples
+        --------
+        #compare the distribution of x across each key
+        Facet(key, x).kde()
+        """
+        uniq, codes, dims = self._codes()
+        nfacet = np.product(dims)
+        grid, density = binned_kde(codes, self.data[0], nfacet,
+                                   bandwidth=bandwidth, gridsize=gridsize,
+                                   extent=extent)
+
+        axes = self._subplots
+        for i in np.flatnonzero(np.bincount(codes, minlength=nfacet)):
+            key = [u[j] for u, j in zip(uniq, np.unravel_index(i, dims))]
+            a = axes[self._pick_axes(key)]
+            a.plot(grid, density[i], **kwargs)
+            a.set_title(self._label(self._key_values(key)))
+
+        self._label_figure(a.figure)
+        return grid, density
+
     def __getattr__(self, method):
         """
         All axes plot methods are available as atttributes.
@@ -229,21 +461,65 @@ class Facet(object):
         data = np.array([1, 2, 2, 3])
         f = Facet(key, data).plot()
         """
+        return self._wrapper(method).__get__(self, type(self))
+
+    @classmethod
+    def _wrapper(cls, method):
+        """
+        Return a (cached) function which dispatches the axes method
+        `method` over each facet
+        """
         try:
-            target = getattr(Axes, method)
-        except AttributeError:
+            return cls._methods[method]
+        except KeyError:
+            pass
+
+        target = getattr(Axes, method, None)
+        if method.startswith('_') or not hasattr(target, '__call__'):
             raise AttributeError("%s is not a valid Axes plot method" % method)
 
+        def dispatch(self, *args, **kwargs):
+            return self._dispatch(method, *args, **kwargs)
+
         hdr = "\nFaceted wrapper for Axes.%s\n\n" % method
-        result = wraps(target)(partial(self._dispatch, method))
-        result.__doc__ = hdr + result.__doc__
+        result = wraps(target)(dispatch)
+        result.__doc__ = hdr + (target.__doc__ or '')
+        cls._methods[method] = result
         return result
 
+    def _codes(self):
+        """
+        Compute the facet of each data element
+
+        Returns
+        -------
+        uniq, codes, dims
+
+        uniq : list of the sorted unique values of each key
+        codes : The flattened facet index of each element in the
+                (raveled) data
+        dims : The number of unique values in each key
+        """
+        #keys have few unique values, so a binary search
+        #is much cheaper than re-sorting the keys
+        uniq = self._uniques
+        inv = [np.searchsorted(u, np.ravel(k))
+               for u, k in zip(uniq, self._keys)]
+        dims = tuple(u.size for u in uniq)
+        codes = np.ravel_multi_index([np.ravel(i) for i in inv], dims)
+        return uniq, codes, dims
+
     def _pick_axes(self, key):
         #given a key value, return the index of the approrpriate axes
         #in the subplots array
         return tuple(i[k] for k, i in zip(key, self._key_index))
 
+    def _key_values(self, key):
+        #given a grouped key, replace the codes of binned keys
+        #with their interval labels
+        return [k if labels is None else labels[k]
+                for k, labels in zip(key, self._bin_labels)]
+
     def _label(self, key):
         """
         Given a facet key, return a label
@@ -273,7 +549,8 @@ class Facet(object):
 
         Each facet item has four attributes:
           * axes : An axes object
-          * data : A tuple of the faceted data
+          * data : A sequence of the faceted data. Each array
+                   is only extracted when first accessed
           * key : The value(s) of the key used for the facet
           * label : A label for key
 
@@ -283,9 +560,9 @@ class Facet(object):
         """
         axes = self._subplots
         used = []
-        for k, ind in groupby(*self._keys):
+        for k, ind in groupby(*self._keys, processes=self._processes):
             a = axes[self._pick_axes(k)]
             used.append(a)
-            data = [d[ind] for d in self.data]
+            k = self._key_values(k)
             label = self._label(k)
-            yield FacetItem(axes=a, data=data, key=k, label=label)
+            yield FacetItem(a, self.data, ind, k, label)
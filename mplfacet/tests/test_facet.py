@@ -1,7 +1,9 @@
 import numpy as np
 from nose.tools import assert_raises
 
-from ..facet import Facet
+from .. import facet as facet_module
+from ..facet import Facet, FacetItem
+from ..util import Quantiles
 
 
 class TestPickAxes(object):
@@ -115,3 +117,220 @@ def test_label_caller():
 def test_empty_facet():
     x = np.array([])
     assert_raises(ValueError, Facet, x, x)
+
+
+class MockAxes(object):
+
+    def plot(self, *args, **kwargs):
+        """Plot some data"""
+        return args, kwargs
+
+
+class TestFacetItem(object):
+
+    x = np.array([1, 2, 3, 4])
+    y = np.array([5, 6, 7, 8])
+    ind = (np.array([1, 3]),)
+
+    @property
+    def item(self):
+        return FacetItem(MockAxes(), [self.x, self.y], self.ind, [1], '1')
+
+    def test_lazy_data(self):
+        item = self.item
+        data = item.data
+        assert item.data is data
+        assert data._cache == [None, None]
+        np.testing.assert_array_equal(data[1], [6, 8])
+        assert data._cache[0] is None
+        assert data[1] is data[1]
+        np.testing.assert_array_equal(data[-2], [2, 4])
+        assert len(data) == 2
+        assert_raises(IndexError, data.__getitem__, -3)
+        assert_raises(IndexError, data.__getitem__, 2)
+
+    def test_wrapper(self):
+        args, kwargs = self.item.plot('r', lw=3)
+        assert len(args) == 3
+        np.testing.assert_array_equal(args[0], [2, 4])
+        np.testing.assert_array_equal(args[1], [6, 8])
+        assert args[2] == 'r'
+        assert kwargs == dict(lw=3)
+        assert 'Plot some data' in self.item.plot.__doc__
+
+    def test_wrapper_cached(self):
+        other = FacetItem(MockAxes(), [self.x], self.ind, [2], '2')
+        assert self.item.plot.__func__ is other.plot.__func__
+
+    def test_bad_method(self):
+        assert_raises(AttributeError, getattr, self.item, 'not_a_method')
+        assert_raises(AttributeError, getattr, self.item, '_private')
+
+    def test_unpack(self):
+        item = self.item
+        axes, data, key, label = item
+        assert axes is item.axes
+        assert key == [1]
+        assert label == '1'
+
+    def test_indexing(self):
+        item = self.item
+        assert len(item) == 4
+        assert item[0] is item.axes
+        assert item[1] is item.data
+        assert item[-1] == '1'
+        assert item[2:] == ([1], '1')
+        assert item._asdict()['label'] == '1'
+
+
+def test_facet_wrapper_cached():
+    x = np.array([1, 2, 3])
+    f = Facet(x, x)
+    g = Facet(x, x)
+    assert f.scatter.__func__ is g.scatter.__func__
+    assert 'Faceted wrapper' in f.scatter.__doc__
+    assert_raises(AttributeError, getattr, f, 'not_a_method')
+
+
+def test_codes():
+    k1 = np.array([3, 1, 3, 1])
+    k2 = np.array([1, 1, 2, 2])
+    uniq, codes, dims = Facet([k1, k2], k1)._codes()
+    assert dims == (2, 2)
+    np.testing.assert_array_equal(codes, [2, 0, 3, 1])
+    np.testing.assert_array_equal(uniq[0], [1, 3])
+
+
+class TestBins(object):
+
+    def test_continuous_key(self):
+        x = np.linspace(0, 1, 100)
+        assert_raises(ValueError, Facet, x, x)
+
+        f = Facet(x, x, bins=4)
+        assert f._subplot_dims() == (2, 2)
+        assert f._pick_axes([1]) == (0,)
+        assert f._label(f._key_values([1])) == '[0, 0.25)'
+        assert f._label(f._key_values([4])) == '[0.75, 1]'
+
+    def test_nonfinite_key(self):
+        x = np.array([0, 1, 2, np.nan, np.nan, np.inf])
+        f = Facet(x, x, bins=2)
+        assert [f._key_values([k])[0] for k in sorted(f._key_index[0])] == \
+            ['[0, 1)', '[1, 2]', '> 2', 'nan']
+        assert f._pick_axes([4]) == (3,)
+
+    def test_empty_bins_skipped(self):
+        x = np.array([0.5, 0.5, 2.5])
+        f = Facet(x, x, bins=[0, 1, 2, 3])
+        assert f._subplot_dims() == (1, 2)
+        assert f._pick_axes([3]) == (1,)
+        assert f._key_values([3]) == ['[2, 3)']
+        np.testing.assert_array_equal(f._uniques[0], [1, 3])
+
+    def test_two_keys(self):
+        x = np.linspace(0, 1, 100)
+        y = np.arange(100) % 2
+        f = Facet([x, y], x, bins=[Quantiles(3), None])
+        assert f._subplot_dims() == (3, 2)
+        key = f._key_values([1, 1])
+        assert key[1] == 1
+        assert key[0].startswith('[0, ')
+
+        assert_raises(ValueError, Facet, [x, y], x, bins=[1, 2, 3])
+
+
+def test_processes():
+    x = np.array([3, 1, 1, 2, 3, 2])
+    y = np.array([1, 1, 2, 2, 1, 2])
+    f = Facet([x, y], x)
+    g = Facet([x, y], x, processes=2)
+    assert f._key_index == g._key_index
+    np.testing.assert_array_equal(f._codes()[1], g._codes()[1])
+
+
+class RecordingAxes(object):
+
+    def __init__(self):
+        self.lines = []
+        self.title = None
+        self.figure = None
+
+    def plot(self, *args, **kwargs):
+        self.lines.append((args, kwargs))
+
+    def set_title(self, title):
+        self.title = title
+
+
+class TestKDE(object):
+
+    def kde(self, facet, **kwargs):
+        #stub out figure creation, and record what is drawn
+        created = []
+
+        def subplots(nrows=1, ncols=1, **kwargs):
+            axes = np.array([RecordingAxes() for i in range(nrows * ncols)])
+            created.append(axes.reshape(nrows, ncols))
+            return None, created[-1]
+
+        old = facet_module.subplots
+        facet_module.subplots = subplots
+        try:
+            result = facet.kde(**kwargs)
+        finally:
+            facet_module.subplots = old
+        return created[0].squeeze(), result
+
+    def test_one_key(self):
+        key = np.array([1, 1, 1, 2, 2, 2])
+        x = np.array([0., 1, 2, 5, 6, 7])
+        axes, (grid, density) = self.kde(Facet(key, x), color='r')
+
+        assert density.shape == (2, 512)
+        for ax, label, d in zip(axes, ['1', '2'], density):
+            assert len(ax.lines) == 1
+            (gx, gy), kwargs = ax.lines[0]
+            assert gx is grid
+            np.testing.assert_array_equal(gy, d)
+            assert kwargs == dict(color='r')
+            assert ax.title == label
+
+    def test_two_keys(self):
+        k1 = np.array([1, 1, 2, 2, 2])
+        k2 = np.array([1, 2, 1, 1, 1])
+        x = np.array([0., 0, 0, 1, 2])
+        f = Facet([k1, k2], x, labeler=lambda k: '%s-%s' % k)
+        axes, (grid, density) = self.kde(f, bandwidth=[1, 2, 3, 4],
+                                         extent=(-20, 20))
+
+        #(2, 2) is empty, and is skipped
+        assert axes[1, 1].lines == []
+        assert axes[1, 1].title is None
+        assert (density[3] == 0).all()
+
+        assert axes[0, 0].title == '1-1'
+        assert axes[0, 1].title == '1-2'
+        assert axes[1, 0].title == '2-1'
+
+        #bandwidths are assigned in row-major order. The single
+        #points in (1, 1) and (1, 2) are smoothed by 1 and 2
+        dx = grid[1] - grid[0]
+        peak = 1 / np.sqrt(2 * np.pi)
+        np.testing.assert_allclose(density[0].max(), peak, rtol=1e-2)
+        np.testing.assert_allclose(density[1].max(), peak / 2, rtol=1e-2)
+        np.testing.assert_allclose(density[2].sum() * dx, 1, rtol=1e-2)
+
+    def test_binned_titles(self):
+        key = np.array([0.1, 0.2, 0.9])
+        x = np.array([1., 2, 3])
+        axes, result = self.kde(Facet(key, x, bins=[0, 0.5, 1]))
+        assert [ax.title for ax in axes] == ['[0, 0.5)', '[0.5, 1)']
+
+
+def test_nan_key_processes():
+    x = np.array([1., np.nan, 2., np.nan])
+    f = Facet(x, x)
+    g = Facet(x, x, processes=2)
+    assert len(f._key_index[0]) == len(g._key_index[0]) == 3
+    assert f._subplot_dims() == g._subplot_dims()
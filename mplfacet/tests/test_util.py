@@ -1,6 +1,8 @@
 import numpy as np
+from nose.tools import assert_raises
 
-from ..util import groupby
+from ..util import (groupby, unique, binned_kde, bin_codes, Quantiles,
+                    _normal_bandwidth)
 
 
 def check_groupby(*arrs):
@@ -55,3 +57,178 @@ class TestGroupBy(object):
 
     def test_arraylike(self):
         check_groupby([1, 1, 2, 3, 1, 2, 3])
+
+
+def check_sharded(*arrs):
+    for processes in [2, 3]:
+        serial = list(groupby(*arrs))
+        sharded = list(groupby(*arrs, processes=processes))
+        assert len(serial) == len(sharded)
+        for (k1, i1), (k2, i2) in zip(serial, sharded):
+            for a, b in zip(k1, k2):
+                np.testing.assert_array_equal(a, b)
+            for a, b in zip(i1, i2):
+                np.testing.assert_array_equal(a, b)
+
+
+class TestShardedGroupBy(object):
+
+    def test_1d(self):
+        check_sharded(np.array([3, 1, 1, 8, 3, 2, 1]))
+
+    def test_fewer_items_than_processes(self):
+        check_sharded(np.array([1]))
+        check_sharded(np.array([2, 1]))
+
+    def test_twoarr(self):
+        x = np.random.randint(0, 3, 1000).reshape(10, 100)
+        y = np.random.randint(0, 3, 1000).reshape(10, 100)
+        check_sharded(x, y)
+
+    def test_high_cardinality(self):
+        x = np.random.randint(0, 5000, 20000)
+        y = np.random.randint(0, 2, 20000)
+        check_sharded(x, y)
+
+    def test_nan(self):
+        x = np.array([1., np.nan, 2., np.nan, 1., np.nan])
+        check_sharded(x)
+        check_sharded(x, np.array([1, 2, 1, 2, 1, 1]))
+        assert len(list(groupby(x))) == 3
+
+    def test_strings(self):
+        check_sharded(np.array(['b', 'a', 'c', 'a', 'b']),
+                      np.array([1, 2, 1, 2, 1]))
+
+    def test_object_fallback(self):
+        check_sharded(np.array(['b', 'a', 'b'], dtype=object))
+
+
+class TestBinnedKDE(object):
+
+    def test_normalized(self):
+        codes = np.random.randint(0, 3, 1000)
+        x = np.random.normal(size=1000) + codes
+        grid, density = binned_kde(codes, x, 3)
+        assert density.shape == (3, 512)
+        dx = grid[1] - grid[0]
+        np.testing.assert_allclose(density.sum(axis=1) * dx, 1, rtol=1e-3)
+
+    def test_matches_direct(self):
+        codes = np.array([0, 0, 0, 1, 1])
+        x = np.array([0., 1., 3., 5., 6.])
+        grid, density = binned_kde(codes, x, 2, bandwidth=[1., 2.],
+                                   gridsize=2001, extent=(-10, 20))
+        for c, h in [(0, 1.), (1, 2.)]:
+            xx = x[codes == c][:, np.newaxis]
+            expected = np.exp(-(grid - xx) ** 2 / (2 * h ** 2)).sum(axis=0)
+            expected /= xx.size * h * np.sqrt(2 * np.pi)
+            np.testing.assert_allclose(density[c], expected, atol=1e-3)
+
+    def test_default_bandwidth(self):
+        np.random.seed(0)
+        codes = np.repeat([0, 1], 1000)
+        x = np.random.normal(size=2000) * np.repeat([1, 1e-3], 1000)
+        expected = 1.06 * np.array([x[:1000].std(ddof=1),
+                                    x[1000:].std(ddof=1)]) * 1000 ** -0.2
+
+        #a large offset should not affect the bandwidths
+        for offset in [0, 1e4, 1e9]:
+            bw = _normal_bandwidth(codes, x + offset, np.bincount(codes) * 1.)
+            np.testing.assert_allclose(bw, expected, rtol=1e-3)
+
+    def test_empty_group(self):
+        grid, density = binned_kde([0, 0, 2], [1., 2., 3.], 3)
+        assert (density[1] == 0).all()
+        assert density[0].max() > 0
+        assert density[2].max() > 0
+
+    def test_ignores_nonfinite(self):
+        g1, d1 = binned_kde([0, 0, 0], [1., 2., np.nan], 1)
+        g2, d2 = binned_kde([0, 0], [1., 2.], 1)
+        np.testing.assert_array_equal(g1, g2)
+        np.testing.assert_allclose(d1, d2)
+
+    def test_bad_input(self):
+        assert_raises(ValueError, binned_kde, [0, 0], [1., 2.], 1,
+                      bandwidth=0)
+        assert_raises(ValueError, binned_kde, [0, 0], [1., 2.], 1,
+                      gridsize=1)
+        assert_raises(ValueError, binned_kde, [0], [1., 2.], 1)
+
+
+class TestBinCodes(object):
+
+    def test_edges(self):
+        x = np.array([-1, 0, 0.5, 1, 2, 3])
+        codes, labels = bin_codes(x, [0, 1, 2])
+        np.testing.assert_array_equal(codes, [0, 1, 1, 2, 3, 3])
+        assert list(labels) == ['< 0', '[0, 1)', '[1, 2)', '>= 2', 'nan']
+
+    def test_equal_width(self):
+        x = np.array([[0, 1], [3, 4]])
+        codes, labels = bin_codes(x, 2)
+        np.testing.assert_array_equal(codes, [[1, 1], [2, 2]])
+        assert list(labels) == ['< 0', '[0, 2)', '[2, 4]', '> 4', 'nan']
+
+    def test_unsigned(self):
+        x = np.array([3, 1, 2], dtype=np.uint8)
+        for spec in [2, Quantiles(2)]:
+            codes, labels = bin_codes(x, spec)
+            assert list(labels[codes]) == ['[2, 3]', '[1, 2)', '[2, 3]']
+
+    def test_constant(self):
+        codes, labels = bin_codes(np.array([2., 2.]), 3)
+        assert (codes == codes[0]).all()
+        assert labels[codes[0]] == '[1.5, 2.5]'
+
+    def test_quantiles(self):
+        x = np.random.normal(size=1000)
+        codes, labels = bin_codes(x, Quantiles(4))
+        assert len(labels) == 7
+        np.testing.assert_array_equal(np.bincount(codes), [0] + [250] * 4)
+
+    def test_duplicate_quantiles(self):
+        x = np.array([1, 1, 1, 1, 2])
+        codes, labels = bin_codes(x, Quantiles(4))
+        assert labels[1] == '[1, 2]'
+        np.testing.assert_array_equal(codes, 1)
+
+    def test_nonfinite(self):
+        x = np.array([np.nan, -np.inf, 0, 1, 2, np.inf, np.nan])
+        codes, labels = bin_codes(x, 2)
+        assert list(labels[codes]) == ['nan', '< 0', '[0, 1)', '[1, 2]',
+                                       '[1, 2]', '> 2', 'nan']
+
+        codes, labels = bin_codes(x, [0, 1, 2])
+        assert list(labels[codes]) == ['nan', '< 0', '[0, 1)', '[1, 2)',
+                                       '>= 2', '>= 2', 'nan']
+
+        codes, labels = bin_codes(x, Quantiles(2))
+        assert list(labels[codes]) == ['nan', '< 0', '[0, 1)', '[1, 2]',
+                                       '[1, 2]', '> 2', 'nan']
+
+    def test_label_precision(self):
+        codes, labels = bin_codes(1e6 + np.linspace(0, 1, 100), 4)
+        assert list(labels[1:5]) == ['[1000000, 1000000.25)',
+                                     '[1000000.25, 1000000.5)',
+                                     '[1000000.5, 1000000.75)',
+                                     '[1000000.75, 1000001]']
+
+    def test_bad_bins(self):
+        x = np.array([1., 2.])
+        assert_raises(ValueError, bin_codes, x, 0)
+        assert_raises(ValueError, bin_codes, x, [1])
+        assert_raises(ValueError, bin_codes, x, [2, 1])
+        assert_raises(ValueError, bin_codes, np.array([np.nan]), 3)
+        assert_raises(ValueError, Quantiles, 0)
+
+
+def test_unique():
+    x = np.random.randint(0, 5, 1000).reshape(10, 100)
+    nan = np.array([1., np.nan, np.nan, 2.])
+    for processes in [None, 2, 3]:
+        np.testing.assert_array_equal(unique(x, processes=processes),
+                                      np.unique(x))
+        np.testing.assert_array_equal(unique(nan, processes=processes),
+                                      [1, 2, np.nan])
@@ -1,10 +1,16 @@
+import multiprocessing
 import warnings
 
 import numpy as np
 import matplotlib.pyplot as plt
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
 
-def groupby(*arrs):
+
+def groupby(*arrs, **kwargs):
     """Iterate over unique tuples across a series of arrays
 
     Parameters
@@ -12,6 +18,11 @@ def groupby(*arrs):
     arrs : List of array-like (N dimensional)
         Arrays of the same shape
 
+    processes : int (optional)
+        If greater than 1, split the arrays into this many shards,
+        and sort each shard in a separate process. Useful for
+        very large arrays. The result is identical to the serial case
+
     Yields
     ------
     key, indices
@@ -30,30 +41,459 @@ def groupby(*arrs):
      [2] (array([4]),)
      [3] (array([2]),)
     """
+    processes = kwargs.pop('processes', None)
+    if kwargs:
+        raise TypeError("Unexpected keyword arguments: %s" % list(kwargs))
+
     shp = np.shape(arrs[0])
     for a in arrs:
         if np.shape(a) != shp:
             raise ValueError("All inputs must have the same shape")
 
     f = [np.ravel(a) for a in arrs]
-    lsort = np.lexsort(f[::-1])
+    if processes is not None and processes > 1 and _can_share(f):
+        order, bounds = _sharded_groups(f, processes)
+    else:
+        order, bounds = _sorted_groups(f)
+
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        ind = order[start:stop]
+        key = [ff[ind[0]] for ff in f]
+        #all items in f[ind]] are equal to key
+        yield key, np.unravel_index(ind, shp)
+
+
+def unique(arr, processes=None):
+    """Sorted unique values of an array
+
+    Parameters
+    ----------
+    arr : array-like
+        The values
+
+    processes : int (optional)
+        If greater than 1, sort the array in this many
+        processes, as in `groupby`
 
-    switch = np.zeros(lsort.size + 1, dtype=np.bool)
+    Returns
+    -------
+    The sorted, unique values in arr, as a 1D array
+    """
+    f = [np.ravel(arr)]
+    if processes is None or processes < 2 or not _can_share(f):
+        return np.unique(f[0])
+
+    #find the unique values of each shard in parallel,
+    #then merge them
+    size = f[0].size
+    shms = []
+    try:
+        keys = _share(f, shms)
+        tasks = [(keys, size, start, stop)
+                 for start, stop in _shard_edges(size, processes)]
+        shards = _pool_map(_unique_shard, tasks)
+    finally:
+        _release(shms)
+    return np.unique(np.concatenate(shards))
+
+
+def _sorted_groups(f):
+    """Sort a list of 1D arrays into groups of equal tuples
+
+    Returns
+    -------
+    order, bounds
+
+    order : Indices which lexically sort f
+    bounds : Group boundaries in order. The indices of
+             group i are order[bounds[i]:bounds[i + 1]]
+    """
+    order = np.lexsort(f[::-1])
+
+    switch = np.zeros(order.size, dtype=bool)
+    switch[:1] = True
     for ff in f:
-        switch[:-1] |= (ff[lsort] != np.roll(ff[lsort], 1))
+        s = ff[order]
+        diff = (s[1:] != s[:-1])
+        if s.dtype.kind in 'fc':
+            #NaNs sort last, and form a single group (as in np.unique)
+            nan = np.isnan(s)
+            diff &= ~(nan[1:] & nan[:-1])
+        switch[1:] |= diff
 
     #items between successive Trues in switch are equal
-    #when ordered by lsort
-    switch[0] = False
-    switch[-1] = True
-
-    start = 0
-    for stop in np.where(switch)[0]:
-        key = [ff[lsort[start]] for ff in f]
-        ind = lsort[start:stop]
-        #all items in f[ind]] are equal to key
-        yield key, np.unravel_index(ind, np.asarray(arrs[0]).shape)
-        start = stop
+    #when ordered by order
+    bounds = np.append(np.flatnonzero(switch), order.size)
+    return order, bounds
+
+
+def _can_share(f):
+    #sharded grouping requires non-empty arrays that can be
+    #placed in shared memory
+    return (shared_memory is not None and f[0].size > 0 and
+            not any(ff.dtype.hasobject for ff in f))
+
+
+def _attach(name, dtype, size):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray((size,), dtype=dtype, buffer=shm.buf)
+
+
+def _attach_shard(keys, size, start, stop):
+    """Attach to shared key arrays, and return the
+    shared memory blocks and the views of one shard"""
+    shms = []
+    f = []
+    for name, dtype in keys:
+        shm, arr = _attach(name, dtype, size)
+        shms.append(shm)
+        f.append(arr[start:stop])
+    return shms, f
+
+
+def _share(f, shms):
+    """Copy arrays into new shared memory blocks, which are
+    appended to shms. Returns the (name, dtype) of each block"""
+    keys = []
+    for ff in f:
+        shm = shared_memory.SharedMemory(create=True, size=ff.nbytes)
+        shms.append(shm)
+        np.ndarray(ff.shape, dtype=ff.dtype, buffer=shm.buf)[:] = ff
+        keys.append((shm.name, ff.dtype))
+    return keys
+
+
+def _release(shms):
+    for shm in shms:
+        shm.close()
+        shm.unlink()
+
+
+def _shard_edges(size, processes):
+    edges = np.linspace(0, size, min(processes, size) + 1).astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _pool_map(func, tasks):
+    pool = multiprocessing.Pool(len(tasks))
+    try:
+        return pool.map(func, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _unique_shard(task):
+    """Unique values in one shard of a shared array"""
+    keys, size, start, stop = task
+    shms, f = _attach_shard(keys, size, start, stop)
+    result = np.unique(f[0])
+
+    #release views into the shared buffers before closing
+    del f
+    for shm in shms:
+        shm.close()
+    return result
+
+
+def _sort_shard(task):
+    """Sort one shard of the shared key arrays
+
+    Writes the sorted (global) indices of the shard into the
+    shared output array, and returns the key and boundaries
+    of each group in the shard
+    """
+    keys, out, size, start, stop = task
+
+    shms, f = _attach_shard(keys, size, start, stop)
+    shm, result = _attach(out, np.intp, size)
+    shms.append(shm)
+
+    order, bounds = _sorted_groups(f)
+    result[start:stop] = order + start
+    group_keys = [ff[order[bounds[:-1]]] for ff in f]
+
+    #release views into the shared buffers before closing
+    del f, result
+    for shm in shms:
+        shm.close()
+
+    return group_keys, bounds
+
+
+def _sharded_groups(f, processes):
+    """Parallel version of _sorted_groups
+
+    The arrays are copied to shared memory and split into
+    contiguous shards, which are sorted independently by a
+    process pool. The groups from each shard are then merged
+    in shard order. Because the sorts are stable, the result
+    matches _sorted_groups(f)
+    """
+    size = f[0].size
+    shards = _shard_edges(size, processes)
+
+    shms = []
+    try:
+        keys = _share(f, shms)
+        out = shared_memory.SharedMemory(create=True,
+                                         size=size * np.dtype(np.intp).itemsize)
+        shms.append(out)
+
+        tasks = [(keys, out.name, size, start, stop)
+                 for start, stop in shards]
+        results = _pool_map(_sort_shard, tasks)
+
+        #each shard group is a segment of the shared output array
+        seg_keys = [np.concatenate([r[0][i] for r in results])
+                    for i in range(len(f))]
+        seg_start = np.concatenate([b[:-1] + start for (_, b), (start, _)
+                                    in zip(results, shards)])
+        seg_len = np.concatenate([np.diff(b) for _, b in results])
+
+        #group the segments themselves. Ties stay in shard order
+        seg_order, seg_bounds = _sorted_groups(seg_keys)
+
+        #concatenate the segments in sorted order, with one gather.
+        #Element k of the output comes from seg_start[s] + (k - offset),
+        #where s is the segment it falls in, and offset is its
+        #position in the output
+        seg_len = seg_len[seg_order]
+        offsets = np.append(0, np.cumsum(seg_len))
+        gather = np.repeat(seg_start[seg_order] - offsets[:-1], seg_len)
+        gather += np.arange(size)
+
+        local = np.ndarray((size,), dtype=np.intp, buffer=out.buf)
+        order = local[gather]
+        del local, gather
+
+        return order, offsets[seg_bounds]
+    finally:
+        _release(shms)
+
+
+class Quantiles(object):
+    """Binning spec which splits a key into n bins with
+    (roughly) equal numbers of elements
+
+    Examples
+    --------
+    Facet(price, x, bins=Quantiles(4)).hist()
+    """
+    def __init__(self, n):
+        if n < 1:
+            raise ValueError("Number of quantiles must be positive")
+        self.n = n
+
+    def __repr__(self):
+        return "Quantiles(%i)" % self.n
+
+
+def bin_codes(x, bins):
+    """Assign each value in an array to a bin
+
+    Parameters
+    ----------
+    x : array-like
+        The values to bin
+
+    bins : int, Quantiles instance, or sequence of edges
+        If an int, use this many equal-width bins spanning
+        the finite values of x. If a Quantiles instance, place
+        bin edges at quantiles of the finite values of x.
+        Otherwise, the increasing bin edges to use.
+
+    Returns
+    -------
+    codes, labels
+
+    codes : Integer array shaped like x, giving the bin of each element
+    labels : Array of interval labels (e.g. '[0, 1)'), indexed by code
+
+    Bins are half-open, except that the last bin of an int or
+    Quantiles spec also includes its upper edge. Values below the
+    first edge (including -inf), above the last edge (including
+    +inf), and NaNs are each placed in their own bin, labeled
+    '< lo', '>= hi' (or '> hi'), and 'nan'.
+    """
+    x = np.asarray(x)
+
+    if isinstance(bins, Quantiles) or np.ndim(bins) == 0:
+        if not isinstance(bins, Quantiles) and bins < 1:
+            raise ValueError("Number of bins must be positive")
+
+        #only float keys can hold non-finite values
+        finite = np.isfinite(x) if x.dtype.kind in 'fc' else None
+        if x.size == 0 or (finite is not None and not finite.any()):
+            raise ValueError("Cannot bin a key with no finite values")
+
+        if isinstance(bins, Quantiles):
+            q = np.linspace(0, 100, bins.n + 1)
+            edges = np.unique(np.percentile(x if finite is None
+                                            else x[finite], q))
+        elif finite is None:
+            edges = np.linspace(x.min(), x.max(), bins + 1)
+        else:
+            #masked reductions avoid copying the finite values
+            lo = np.min(x, where=finite, initial=np.inf)
+            hi = np.max(x, where=finite, initial=-np.inf)
+            edges = np.linspace(lo, hi, bins + 1)
+
+        if edges[0] == edges[-1]:
+            edges = np.array([edges[0] - .5, edges[0] + .5])
+        closed = True
+    else:
+        edges = np.asarray(bins, dtype=float)
+        if edges.ndim != 1 or edges.size < 2:
+            raise ValueError("Bin edges must be a 1D sequence of at least "
+                             "2 values")
+        if (np.diff(edges) <= 0).any():
+            raise ValueError("Bin edges must be increasing")
+        closed = False
+
+    text = _format_edges(edges)
+    labels = (['< %s' % text[0]] +
+              ['[%s, %s)' % e for e in zip(text[:-1], text[1:])] +
+              ['>= %s' % text[-1], 'nan'])
+
+    #NaN sorts after every other value, so appending it as an
+    #extra edge gives NaNs their own code in the same pass
+    search = np.append(edges, np.nan)
+    if closed:
+        #include the upper edge in the last bin
+        search[-2] = np.nextafter(edges[-1], np.inf)
+        labels[-3] = labels[-3][:-1] + ']'
+        labels[-2] = '> %s' % text[-1]
+
+    codes = np.searchsorted(search, x, side='right')
+    return codes, np.array(labels, dtype=object)
+
+
+def _format_edges(edges):
+    """Format bin edges with the fewest significant digits
+    (at least 6) that keep each edge within 1% of the bin
+    spacing, so that neighbouring edges stay distinct"""
+    tol = 0.01 * np.diff(edges).min()
+    for precision in range(6, 18):
+        result = ['%.*g' % (precision, e) for e in edges]
+        error = np.abs(np.array(result, dtype=float) - edges)
+        if (error <= tol).all():
+            break
+    return result
+
+
+def binned_kde(codes, x, ngroup, bandwidth=None, gridsize=512, extent=None):
+    """Gaussian kernel density estimates for many groups at once
+
+    All groups are binned onto a shared grid with a single
+    bincount, and smoothed with a batched FFT convolution
+
+    Parameters
+    ----------
+    codes : array-like of ints
+        The group (0 <= code < ngroup) of each element in x
+
+    x : array-like
+        The data values. Non-finite values are ignored
+
+    ngroup : int
+        The number of groups
+
+    bandwidth : float or array-like (optional)
+        The standard deviation of the Gaussian kernel. Either
+        a single value shared by all groups, or one value per group.
+        If not provided, the normal reference rule
+        (1.06 * std * n ** -0.2) is applied to each group
+
+    gridsize : int (optional)
+        The number of grid points
+
+    extent : (lo, hi) (optional)
+        The range of the grid. Defaults to the range of x,
+        padded by 3 bandwidths
+
+    Returns
+    -------
+    grid, density
+
+    grid : Array of gridsize x values
+    density : ngroup x gridsize array. density[i] is the
+              density estimate for group i, evaluated on grid
+    """
+    if gridsize < 2:
+        raise ValueError("gridsize must be at least 2")
+
+    codes = np.ravel(codes)
+    x = np.ravel(x).astype(float)
+    if codes.shape != x.shape:
+        raise ValueError("codes and x must have the same size")
+
+    good = np.isfinite(x)
+    codes, x = codes[good], x[good]
+    if x.size == 0:
+        raise ValueError("No finite data to estimate densities from")
+
+    count = np.bincount(codes, minlength=ngroup).astype(float)
+
+    if bandwidth is None:
+        bandwidth = _normal_bandwidth(codes, x, count)
+    bandwidth = np.ones(ngroup) * bandwidth
+    if (bandwidth <= 0).any():
+        raise ValueError("bandwidth must be positive")
+
+    if extent is None:
+        pad = 3 * bandwidth[count > 0].max()
+        extent = x.min() - pad, x.max() + pad
+    lo, hi = extent
+    grid = np.linspace(lo, hi, gridsize)
+    dx = grid[1] - grid[0]
+
+    #assign each point to its nearest grid point, and bin
+    #every group at once
+    pos = np.round((x - lo) / dx).astype(int)
+    keep = (pos >= 0) & (pos < gridsize)
+    hist = np.bincount(codes[keep] * gridsize + pos[keep],
+                       minlength=ngroup * gridsize)
+    hist = hist.reshape(ngroup, gridsize)
+
+    #convolve with each group's kernel. The analytic transform of
+    #a Gaussian avoids building the kernels, and zero-padding to
+    #2 * gridsize prevents wrap-around
+    nfft = 2 * gridsize
+    freq = np.fft.rfftfreq(nfft)
+    sigma = bandwidth[:, np.newaxis] / dx
+    kernel = np.exp(-2 * (np.pi * sigma * freq) ** 2)
+    density = np.fft.irfft(np.fft.rfft(hist, nfft, axis=1) * kernel,
+                           nfft, axis=1)[:, :gridsize]
+
+    density = np.maximum(density, 0)
+    density /= np.maximum(count, 1)[:, np.newaxis] * dx
+    return grid, density
+
+
+def _normal_bandwidth(codes, x, count):
+    """Normal reference (Silverman) bandwidth for each group,
+    1.06 * std * n ** -0.2
+
+    Groups with fewer than 2 points or no spread use the
+    largest bandwidth of the other groups (or 1, if no group
+    has any spread)"""
+    s1 = np.bincount(codes, x, minlength=count.size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = s1 / count
+
+        #center each group before squaring, to avoid
+        #cancellation when the data have a large offset
+        dev = x - mean[codes]
+        s2 = np.bincount(codes, dev * dev, minlength=count.size)
+        var = s2 / (count - 1)
+        result = 1.06 * np.sqrt(var) * count ** -0.2
+
+    bad = ~(result > 0)
+    if bad.all():
+        return 1.
+    result[bad] = result[~bad].max()
+    return result
 
 
 def subplots(nrows=1, ncols=1, num=None, sharex=False,